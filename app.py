@@ -1,29 +1,50 @@
 import os
+import re
 import json
+import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Any
+from functools import lru_cache
+from array import array
+from typing import List, Dict, Any, Optional, Annotated, Tuple
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from cachetools import LRUCache
+import orjson
+import ijson
 import google.generativeai as genai
+from google.generativeai import client as genai_client
+from google.api_core import exceptions as google_exceptions
 from dotenv import load_dotenv
 from mangum import Mangum
 
-# Configure logging
+# Load environment variables
+load_dotenv()
+
+# Configure logging (set LOG_LEVEL=WARNING in production to skip per-request logs)
+LOG_LEVEL = (os.getenv("LOG_LEVEL") or "INFO").upper()
+_unknown_log_level = LOG_LEVEL not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+if _unknown_log_level:
+    LOG_LEVEL = "INFO"
+
 logging.basicConfig(
-    level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
+# basicConfig does nothing when the root logger already has a handler (as on
+# AWS Lambda), so set the level on the root logger directly
+logging.getLogger().setLevel(LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+if _unknown_log_level:
+    logger.warning("Unknown LOG_LEVEL %r, using INFO", os.getenv("LOG_LEVEL"))
 
 # Initialize FastAPI app
 app = FastAPI(
     title="AI Diet Plan & Nutrition API",
     description="Generate personalized diet plans and nutritional breakdown using Google Gemini AI",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Configure Google Gemini API
@@ -39,13 +60,26 @@ try:
     model = genai.GenerativeModel('gemini-2.5-flash')
     logger.info("Google Gemini API configured successfully")
 except Exception as e:
-    logger.error(f"Failed to initialize Gemini model: {str(e)}")
+    logger.error("Failed to initialize Gemini model: %s", e)
     raise
 
+# Cache of validated responses keyed by normalized request, so repeated
+# and near-identical requests skip the Gemini round-trip entirely
+RESPONSE_CACHE_SIZE = 1024
+response_cache: LRUCache = LRUCache(maxsize=RESPONSE_CACHE_SIZE)
+
 
 # ==================== Pydantic Models ====================
 logger.info("Pydantic Models initialized.....")
 
+# Request size limits, keeping prompts (and Gemini input tokens) bounded
+MAX_TEXT_LENGTH = 100
+MAX_LIST_ITEMS = 20
+MAX_FOODS_PER_REQUEST = 50
+MAX_MEALS_PER_BATCH = 32
+
+ShortText = Annotated[str, Field(max_length=MAX_TEXT_LENGTH)]
+
 class MealItems(BaseModel):
     """Model for meal items and calories"""
     items: List[str] = Field(..., description="List of food items for the meal")
@@ -73,8 +107,8 @@ class DietPlanResponse(BaseModel):
 
 class FoodItem(BaseModel):
     """Model for individual food item with quantity"""
-    item: str = Field(..., description="Name of the food item")
-    quantity: str = Field(..., description="Quantity of the food item (e.g., '200 gms', '4 pieces')")
+    item: str = Field(..., max_length=MAX_TEXT_LENGTH, description="Name of the food item")
+    quantity: str = Field(..., max_length=MAX_TEXT_LENGTH, description="Quantity of the food item (e.g., '200 gms', '4 pieces')")
 
 
 class MacroNutrients(BaseModel):
@@ -105,50 +139,49 @@ class NutritionBreakdownResponse(BaseModel):
     meal_nutrition: MealNutrition
 
 
+class BatchNutritionResults(BaseModel):
+    """Model for a single Gemini analysis covering several nutrition requests"""
+    results: List[MealNutrition] = Field(..., description="Meal nutrition per batch, in request order")
+
+
+# Validators for Gemini output, built once so each response is parsed and
+# validated straight from the JSON text by the compiled core schema
+DIET_PLAN_ADAPTER = TypeAdapter(DietPlanResponse)
+NUTRITION_ADAPTER = TypeAdapter(NutritionBreakdownResponse)
+BATCH_NUTRITION_ADAPTER = TypeAdapter(BatchNutritionResults)
+
+
 class DietPlanRequest(BaseModel):
     """Request model for diet plan generation"""
-    name: str = Field(..., description="User's name")
+    name: str = Field(..., max_length=MAX_TEXT_LENGTH, description="User's name")
     age: int = Field(..., description="User's age")
-    goal: str = Field(..., description="Fitness goal (e.g., Weight Loss, Muscle Gain)")
+    goal: str = Field(..., max_length=MAX_TEXT_LENGTH, description="Fitness goal (e.g., Weight Loss, Muscle Gain)")
     height: int = Field(..., description="Height in cm")
     current_weight: float = Field(..., description="Current weight in kg")
     target_weight: float = Field(..., description="Target weight in kg")
-    health_conditions: List[str] = Field(default=[], description="List of health conditions")
-    region: str = Field(..., description="Geographic region for cuisine")
-    cuisine_preference: str = Field(..., description="Cuisine preference (e.g., Vegetarian, Non-Vegetarian)")
-    allergies: List[str] = Field(default=[], description="List of allergies")
+    health_conditions: List[ShortText] = Field(default=[], max_length=MAX_LIST_ITEMS, description="List of health conditions")
+    region: str = Field(..., max_length=MAX_TEXT_LENGTH, description="Geographic region for cuisine")
+    cuisine_preference: str = Field(..., max_length=MAX_TEXT_LENGTH, description="Cuisine preference (e.g., Vegetarian, Non-Vegetarian)")
+    allergies: List[ShortText] = Field(default=[], max_length=MAX_LIST_ITEMS, description="List of allergies")
 
 
 class NutritionRequest(BaseModel):
     """Request model for nutrition breakdown"""
-    foods: List[FoodItem] = Field(..., description="List of food items with quantities")
+    foods: List[FoodItem] = Field(..., max_length=MAX_FOODS_PER_REQUEST, description="List of food items with quantities")
+
+
+class BatchNutritionRequest(BaseModel):
+    """Request model for nutrition breakdown of several meals"""
+    meals: List[NutritionRequest] = Field(..., max_length=MAX_MEALS_PER_BATCH, description="Meals to analyze, each with its own food items")
 
 
 # ==================== Helper Functions ====================
 
-def construct_diet_plan_prompt(request: DietPlanRequest) -> str:
-    """
-    Construct a detailed prompt for Gemini to generate a personalized diet plan.
-    
-    Args:
-        request: DietPlanRequest object containing user parameters
-        
-    Returns:
-        Formatted prompt string for Gemini API
-    """
-    prompt = f"""You are a professional nutritionist and dietitian. Generate a personalized 7-day diet plan as a JSON object.
+# Prompts built for recently seen request shapes are reused as-is
+PROMPT_CACHE_SIZE = 4096
 
-User Profile:
-- Name: {request.name}
-- Age: {request.age} years
-- Goal: {request.goal}
-- Height: {request.height} cm
-- Current Weight: {request.current_weight} kg
-- Target Weight: {request.target_weight} kg
-- Health Conditions: {', '.join(request.health_conditions) if request.health_conditions else 'None'}
-- Region: {request.region}
-- Cuisine Preference: {request.cuisine_preference}
-- Allergies: {', '.join(request.allergies) if request.allergies else 'None'}
+# Static prompt sections, built once and shared by every request
+_DIET_PROMPT_REQUIREMENTS = """
 
 Calculate appropriate daily calorie intake based on the user's goal and body metrics.
 
@@ -157,122 +190,805 @@ Requirements:
 2. Total daily calories should be appropriate for the user's goal
 3. Include breakfast, lunch, and dinner with specific items
 4. All food items must comply with cuisine preference and avoid allergens
-5. Use regional cuisine from {request.region}
+5. Use regional cuisine from """
+
+_DIET_PROMPT_SUFFIX = """
 6. Consider health conditions when selecting foods
 7. Include 2-3 healthy snacks
 
 Output Format (valid JSON only, no markdown):
-{{
-  "daily_plan": {{
+{
+  "daily_plan": {
     "total_calories": <number>,
-    "meals": {{
-      "breakfast": {{
+    "meals": {
+      "breakfast": {
         "items": ["item1", "item2"],
         "calories": <number>
-      }},
-      "lunch": {{
+      },
+      "lunch": {
         "items": ["item1", "item2", "item3"],
         "calories": <number>
-      }},
-      "dinner": {{
+      },
+      "dinner": {
         "items": ["item1", "item2"],
         "calories": <number>
-      }}
-    }},
+      }
+    },
     "snacks": ["snack1", "snack2"]
-  }}
-}}
+  }
+}
 
 Important:
 - Return ONLY valid JSON, no additional text or explanation
 - Make the diet plan healthy, balanced, and appropriate for the goal
 - Ensure item names are clear and specific"""
 
-    return prompt
-
-
-def construct_nutrition_prompt(request: NutritionRequest) -> str:
-    """
-    Construct a prompt for Gemini to analyze nutritional content of foods.
-    
-    Args:
-        request: NutritionRequest object containing food items
-        
-    Returns:
-        Formatted prompt string for Gemini API
-    """
-    foods_str = "\n".join([f"- {food.item}: {food.quantity}" for food in request.foods])
-    
-    prompt = f"""You are a professional nutritionist. Analyze the nutritional content of the following food items.
+_NUTRITION_PROMPT_PREFIX = """You are a professional nutritionist. Analyze the nutritional content of the following food items.
 
 Food Items:
-{foods_str}
+"""
+
+_NUTRITION_PROMPT_SUFFIX = """
 
 Provide accurate nutritional breakdown including calories, protein, carbohydrates, and fats.
 
 Output Format (valid JSON only, no markdown):
-{{
-  "meal_nutrition": {{
+{
+  "meal_nutrition": {
     "total_calories": <number>,
-    "macros": {{
+    "macros": {
       "protein": <number in grams>,
       "carbs": <number in grams>,
       "fat": <number in grams>
-    }},
+    },
     "breakdown": [
-      {{
+      {
         "item": "<name> (<quantity>)",
         "calories": <number>,
         "protein": <number in grams>,
         "carbs": <number in grams>,
         "fat": <number in grams>
-      }}
+      }
     ]
-  }}
-}}
+  }
+}
 
 Important:
 - Return ONLY valid JSON, no additional text or explanation
 - Provide realistic and accurate nutritional values
 - Ensure breakdown matches individual food items"""
 
-    return prompt
+_BATCH_NUTRITION_PROMPT_PREFIX = """You are a professional nutritionist. Analyze the nutritional content of each of the following independent batches of food items.
+
+Batches B1..B"""
+
+_BATCH_NUTRITION_PROMPT_FORMAT = """
+
+Provide accurate nutritional breakdown for every batch including calories, protein, carbohydrates, and fats.
+
+Output Format (valid JSON only, no markdown):
+{
+  "results": [
+    {
+      "total_calories": <number>,
+      "macros": {
+        "protein": <number in grams>,
+        "carbs": <number in grams>,
+        "fat": <number in grams>
+      },
+      "breakdown": [
+        {
+          "item": "<name> (<quantity>)",
+          "calories": <number>,
+          "protein": <number in grams>,
+          "carbs": <number in grams>,
+          "fat": <number in grams>
+        }
+      ]
+    }
+  ]
+}
+
+Important:
+- Return ONLY valid JSON, no additional text or explanation
+- Return exactly """
+
+_BATCH_NUTRITION_PROMPT_SUFFIX = """ entries in "results", one per batch, in batch order (B1 first)
+- Provide realistic and accurate nutritional values
+- Ensure each breakdown matches the food items of its own batch"""
+
+
+def _food_pairs(request: NutritionRequest) -> tuple:
+    """Hashable (item, quantity) pairs for a request, in request order."""
+    return tuple((food.item, food.quantity) for food in request.foods)
+
+
+def _format_food_lines(foods: tuple) -> str:
+    """Render (item, quantity) pairs as '- item: quantity' lines for a prompt."""
+    return "\n".join(["- " + item + ": " + quantity for item, quantity in foods])
+
+
+def construct_diet_plan_prompt(request: DietPlanRequest) -> str:
+    """
+    Construct a detailed prompt for Gemini to generate a personalized diet plan.
+    
+    Args:
+        request: DietPlanRequest object containing user parameters
+        
+    Returns:
+        Formatted prompt string for Gemini API
+    """
+    return _build_diet_plan_prompt(
+        request.name, request.age, request.goal, request.height,
+        request.current_weight, request.target_weight,
+        tuple(sorted(request.health_conditions)), request.region,
+        request.cuisine_preference, tuple(sorted(request.allergies))
+    )
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _build_diet_plan_prompt(name: str, age: int, goal: str, height: int, current_weight: float,
+                            target_weight: float, health_conditions: tuple, region: str,
+                            cuisine_preference: str, allergies: tuple) -> str:
+    """Assemble the diet plan prompt from hashable profile fields."""
+    parts = [
+        "You are a professional nutritionist and dietitian. Generate a personalized 7-day diet plan as a JSON object.\n\n"
+        "User Profile:\n- Name: ", name,
+        "\n- Age: ", str(age),
+        " years\n- Goal: ", goal,
+        "\n- Height: ", str(height),
+        " cm\n- Current Weight: ", str(current_weight),
+        " kg\n- Target Weight: ", str(target_weight),
+        " kg\n- Health Conditions: ", ", ".join(health_conditions) or "None",
+        "\n- Region: ", region,
+        "\n- Cuisine Preference: ", cuisine_preference,
+        "\n- Allergies: ", ", ".join(allergies) or "None",
+        _DIET_PROMPT_REQUIREMENTS, region,
+        _DIET_PROMPT_SUFFIX,
+    ]
+    return "".join(parts)
+
+
+def construct_nutrition_prompt(request: NutritionRequest) -> str:
+    """
+    Construct a prompt for Gemini to analyze nutritional content of foods.
+    
+    Args:
+        request: NutritionRequest object containing food items
+        
+    Returns:
+        Formatted prompt string for Gemini API
+    """
+    # Foods keep their order so the breakdown lines up with the request
+    return _build_nutrition_prompt(_food_pairs(request))
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _build_nutrition_prompt(foods: tuple) -> str:
+    """Assemble the nutrition prompt from (item, quantity) pairs."""
+    return "".join([_NUTRITION_PROMPT_PREFIX, _format_food_lines(foods), _NUTRITION_PROMPT_SUFFIX])
+
 
+def construct_batch_nutrition_prompt(requests: List[NutritionRequest]) -> str:
+    """
+    Construct a prompt for Gemini to analyze several independent food lists at once.
+    
+    Args:
+        requests: NutritionRequest objects to analyze, one batch each
+        
+    Returns:
+        Formatted prompt string for Gemini API
+    """
+    count = str(len(requests))
+    parts = [_BATCH_NUTRITION_PROMPT_PREFIX, count, ":"]
+    for index, request in enumerate(requests, 1):
+        parts.extend(["\nB", str(index), ":\n", _format_food_lines(_food_pairs(request))])
+    parts.extend([_BATCH_NUTRITION_PROMPT_FORMAT, count, _BATCH_NUTRITION_PROMPT_SUFFIX])
+    return "".join(parts)
+
+
+# Captures the JSON object inside the first ```json ... ``` fence in one pass
+_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
 
-def parse_gemini_response(text: str) -> Dict[str, Any]:
+
+def parse_gemini_response(text: str, adapter: TypeAdapter) -> Any:
     """
-    Parse Gemini API response and extract JSON content.
+    Extract the JSON content of a Gemini API response and validate it.
     
     Args:
         text: Raw response text from Gemini
+        adapter: TypeAdapter for the expected response model
         
     Returns:
-        Parsed JSON as dictionary
+        Validated response model instance
         
     Raises:
-        ValueError: If JSON parsing fails
+        ValueError: If the response is not valid JSON for the model
     """
+    # Extract JSON from markdown code blocks if present
+    match = _FENCE_RE.search(text)
+    payload = match.group(1) if match else text.strip()
+    
     try:
-        # Try to extract JSON from markdown code blocks if present
-        if "```json" in text:
-            start = text.find("```json") + 7
-            end = text.find("```", start)
-            text = text[start:end].strip()
-        elif "```" in text:
-            start = text.find("```") + 3
-            end = text.find("```", start)
-            text = text[start:end].strip()
-        
-        # Parse JSON
-        return json.loads(text)
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse Gemini response as JSON: {str(e)}")
-        logger.error(f"Response content: {text[:500]}")
+        return adapter.validate_json(payload)
+    except ValidationError as e:
+        logger.error("Failed to parse Gemini response: %s", e)
+        logger.error("Response content: %s", payload[:500])
         raise ValueError(f"Failed to parse AI response: {str(e)}")
 
 
+def _normalize_for_cache(value: Any) -> Any:
+    """Lower-case and collapse whitespace in strings; sort lists of strings."""
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, dict):
+        return {key: _normalize_for_cache(val) for key, val in value.items()}
+    if isinstance(value, list):
+        normalized = [_normalize_for_cache(val) for val in value]
+        if all(isinstance(val, str) for val in normalized):
+            normalized.sort()
+        return normalized
+    return value
+
+
+def request_cache_key(kind: str, request: BaseModel, exclude: set = None) -> str:
+    """
+    Build a cache key for a request that is insensitive to casing, spacing
+    and the order of free-form string lists.
+    
+    Args:
+        kind: Endpoint namespace for the key
+        request: Request model to derive the key from
+        exclude: Fields that do not influence the generated response
+        
+    Returns:
+        Hex digest identifying the normalized request
+    """
+    canonical = json.dumps(
+        _normalize_for_cache(request.model_dump(exclude=exclude)),
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.blake2b(f"{kind}:{canonical}".encode(), digest_size=16).hexdigest()
+
+
+# ==================== Gemini Calls ====================
+
+# Gemini calls currently running, by prompt digest, so concurrent callers with
+# an identical prompt share one call instead of each paying for their own
+_inflight_calls: Dict[bytes, asyncio.Task] = {}
+
+
+async def _call_gemini(prompt: str) -> str:
+    """Send a prompt to Gemini and return the response text."""
+    response = await model.generate_content_async(prompt)
+    return response.text
+
+
+async def generate_text(prompt: str) -> str:
+    """
+    Generate a Gemini response, coalescing concurrent identical prompts.
+    
+    Args:
+        prompt: Prompt to send to Gemini
+        
+    Returns:
+        Raw response text from Gemini
+    """
+    key = hashlib.blake2b(prompt.encode(), digest_size=16).digest()
+    task = _inflight_calls.get(key)
+    if task is None:
+        task = asyncio.get_running_loop().create_task(_call_gemini(prompt))
+        _inflight_calls[key] = task
+        task.add_done_callback(lambda _: _inflight_calls.pop(key, None))
+    
+    # Shield so one caller going away does not cancel the call for the others
+    return await asyncio.shield(task)
+
+
+# ==================== Local Nutrition Lookup ====================
+
+# Per-100 g nutrition for common foods (USDA FoodData Central values), used to
+# answer nutrition requests without calling Gemini when every item is known
+FOOD_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "common_foods.json")
+
+# Quantities like "200 gms", "4 pieces" or "1 cup"
+QUANTITY_RE = re.compile(
+    r"\s*(?P<amount>\d+(?:\.\d+)?)\s*"
+    r"(?P<unit>g|gm|gms|gram|grams|kg|oz|ml|l|piece|pieces|cup|cups)\s*",
+    re.IGNORECASE
+)
+
+# Grams per unit for units that measure weight directly
+GRAMS_PER_UNIT = {"g": 1, "gm": 1, "gms": 1, "gram": 1, "grams": 1, "kg": 1000, "oz": 28.35}
+# Millilitres per unit; converted to grams only for liquids
+ML_PER_UNIT = {"ml": 1, "l": 1000}
+
+
+def parse_quantity(quantity: str) -> Tuple[Optional[float], Optional[str]]:
+    """
+    Split a quantity string into its amount and lower-cased unit.
+    
+    Args:
+        quantity: Quantity such as "200 gms" or "4 pieces"
+        
+    Returns:
+        Tuple of (amount, unit), or (None, None) if the quantity is not recognized
+    """
+    match = QUANTITY_RE.fullmatch(quantity)
+    if not match:
+        return None, None
+    return float(match["amount"]), match["unit"].lower()
+
+
+def _normalize_food_name(name: str) -> str:
+    """Lower-case a food name and collapse its whitespace for lookup."""
+    return " ".join(name.lower().split())
+
+
+class FoodTable:
+    """
+    Common foods stored column-wise: one float array per nutrient (per 100 g)
+    and per serving weight, plus an index from normalized name or alias to
+    the row. Aggregation then walks flat arrays instead of per-food dicts.
+    """
+
+    def __init__(self, foods: List[Dict[str, Any]]):
+        self.index: Dict[str, int] = {}
+        self.calories = array("d")
+        self.protein = array("d")
+        self.carbs = array("d")
+        self.fat = array("d")
+        # 0 marks a serving size or ml conversion that is not defined for the food
+        self.piece_g = array("d")
+        self.cup_g = array("d")
+        self.ml_g = array("d")
+        
+        for row, food in enumerate(foods):
+            for name in [food["name"], *food.get("aliases", [])]:
+                self.index[_normalize_food_name(name)] = row
+            self.calories.append(food["calories"])
+            self.protein.append(food["protein"])
+            self.carbs.append(food["carbs"])
+            self.fat.append(food["fat"])
+            self.piece_g.append(food.get("piece_g", 0))
+            self.cup_g.append(food.get("cup_g", 0))
+            # Only liquids are close enough to 1 g/ml to convert directly
+            self.ml_g.append(1 if food.get("liquid") else 0)
+
+    @classmethod
+    def load(cls, path: str) -> "FoodTable":
+        """Load the table from a JSON list of food entries."""
+        with open(path, "rb") as f:
+            return cls(orjson.loads(f.read()))
+
+    def grams(self, row: int, quantity: str) -> Optional[float]:
+        """Convert a quantity string to grams of the food in the given row, if possible."""
+        amount, unit = parse_quantity(quantity)
+        if unit is None:
+            return None
+        
+        if unit in GRAMS_PER_UNIT:
+            return amount * GRAMS_PER_UNIT[unit]
+        if unit in ML_PER_UNIT:
+            grams_per_unit = ML_PER_UNIT[unit] * self.ml_g[row]
+        elif unit in ("piece", "pieces"):
+            grams_per_unit = self.piece_g[row]
+        else:
+            grams_per_unit = self.cup_g[row]
+        return amount * grams_per_unit if grams_per_unit else None
+
+    def aggregate(self, rows: List[int], grams: List[float]) -> tuple:
+        """
+        Scale each item's nutrients and sum the meal in a single pass.
+        
+        Args:
+            rows: Table row of each item
+            grams: Weight in grams of each item
+            
+        Returns:
+            Tuple of per-item (calories, protein, carbs, fat) tuples and the
+            meal totals as (calories, protein, carbs, fat)
+        """
+        calories, protein, carbs, fat = self.calories, self.protein, self.carbs, self.fat
+        items = []
+        total_calories = 0
+        total_protein = total_carbs = total_fat = 0.0
+        for row, weight in zip(rows, grams):
+            factor = weight / 100
+            item = (
+                round(calories[row] * factor),
+                round(protein[row] * factor, 1),
+                round(carbs[row] * factor, 1),
+                round(fat[row] * factor, 1)
+            )
+            items.append(item)
+            total_calories += item[0]
+            total_protein += item[1]
+            total_carbs += item[2]
+            total_fat += item[3]
+        return items, (total_calories, round(total_protein, 1), round(total_carbs, 1), round(total_fat, 1))
+
+
+def lookup_local_nutrition(request: NutritionRequest) -> Optional[NutritionBreakdownResponse]:
+    """
+    Compute a nutrition breakdown from the local food table.
+    
+    Args:
+        request: NutritionRequest containing food items
+        
+    Returns:
+        NutritionBreakdownResponse if every item and quantity is recognized,
+        otherwise None so the request falls through to Gemini
+    """
+    rows, grams = [], []
+    for food_item in request.foods:
+        row = food_table.index.get(_normalize_food_name(food_item.item))
+        if row is None:
+            return None
+        weight = food_table.grams(row, food_item.quantity)
+        if weight is None:
+            return None
+        rows.append(row)
+        grams.append(weight)
+    
+    items, (total_calories, protein, carbs, fat) = food_table.aggregate(rows, grams)
+    breakdown = [
+        NutritionBreakdown(
+            item=f"{food_item.item} ({food_item.quantity})",
+            calories=item[0],
+            protein=item[1],
+            carbs=item[2],
+            fat=item[3]
+        )
+        for food_item, item in zip(request.foods, items)
+    ]
+    return NutritionBreakdownResponse(meal_nutrition=MealNutrition(
+        total_calories=total_calories,
+        macros=MacroNutrients(protein=protein, carbs=carbs, fat=fat),
+        breakdown=breakdown
+    ))
+
+
+food_table = FoodTable.load(FOOD_TABLE_PATH)
+
+
+# ==================== Nutrition Batching ====================
+
+class NutritionBatcher:
+    """
+    Collects nutrition requests arriving close together and analyzes them with
+    a single Gemini call, resolving each caller with its own breakdown.
+    """
+
+    def __init__(self, max_batch: int = 16, max_wait: float = 0.025):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._loop = None
+        self._queue = None
+        self._worker = None
+        self._dispatches = set()
+
+    async def submit(self, request: NutritionRequest) -> NutritionBreakdownResponse:
+        """
+        Queue a request for the next batch and wait for its result.
+        
+        Args:
+            request: NutritionRequest to analyze
+            
+        Returns:
+            NutritionBreakdownResponse for this request
+            
+        Raises:
+            ValueError: If the batched response cannot be parsed
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker.done():
+            # Queues and tasks are bound to the loop that created them
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._collect())
+        
+        future = loop.create_future()
+        await self._queue.put((request, future))
+        return await future
+
+    async def _collect(self):
+        """Drain the queue into batches of up to max_batch items or max_wait seconds."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Keep collecting the next batch while this one waits on Gemini
+            dispatch = loop.create_task(self._dispatch(batch))
+            self._dispatches.add(dispatch)
+            dispatch.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: list):
+        """Analyze one batch and hand each caller its result or the failure."""
+        # Identical requests in the same batch are analyzed once
+        keys = [request_cache_key("nutrition", request) for request, _ in batch]
+        unique_requests = {}
+        for key, (request, _) in zip(keys, batch):
+            unique_requests.setdefault(key, request)
+        
+        requests = list(unique_requests.values())
+        
+        try:
+            outcomes = await self._analyze(requests)
+        except ValueError as e:
+            if len(requests) == 1:
+                outcomes = [e]
+            else:
+                # A malformed batched reply must not fail unrelated callers; analyze
+                # each request on its own so only its own failure reaches it
+                logger.warning(
+                    "Batched nutrition response unusable (%s); retrying %s requests individually",
+                    e, len(requests)
+                )
+                outcomes = await asyncio.gather(
+                    *[self._analyze_one(request) for request in requests],
+                    return_exceptions=True
+                )
+        except Exception as e:
+            outcomes = [e] * len(requests)
+        
+        outcomes_by_key = dict(zip(unique_requests, outcomes))
+        for key, (_, future) in zip(keys, batch):
+            if future.done():
+                continue
+            outcome = outcomes_by_key[key]
+            if isinstance(outcome, BaseException):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    async def _analyze_one(self, request: NutritionRequest) -> NutritionBreakdownResponse:
+        """Analyze a single request with its own Gemini call."""
+        return (await self._analyze([request]))[0]
+
+    async def _analyze(self, requests: List[NutritionRequest]) -> List[NutritionBreakdownResponse]:
+        """Call Gemini once for all requests and split the response per request."""
+        logger.info("Calling Google Gemini API for %s nutrition request(s)...", len(requests))
+        if len(requests) == 1:
+            response_text = await generate_text(construct_nutrition_prompt(requests[0]))
+            return [parse_gemini_response(response_text, NUTRITION_ADAPTER)]
+        
+        response_text = await generate_text(construct_batch_nutrition_prompt(requests))
+        batch_results = parse_gemini_response(response_text, BATCH_NUTRITION_ADAPTER)
+        if len(batch_results.results) != len(requests):
+            raise ValueError(
+                f"Failed to parse AI response: expected {len(requests)} batch results, "
+                f"got {len(batch_results.results)}"
+            )
+        return [
+            NutritionBreakdownResponse(meal_nutrition=meal_nutrition)
+            for meal_nutrition in batch_results.results
+        ]
+
+
+nutrition_batcher = NutritionBatcher()
+
+
+# ==================== Streaming ====================
+
+# JSON paths emitted as partial events while the response is still generating
+DIET_PLAN_STREAM_PATHS = (
+    "daily_plan.total_calories",
+    "daily_plan.meals.breakfast",
+    "daily_plan.meals.lunch",
+    "daily_plan.meals.dinner",
+    "daily_plan.snacks",
+)
+NUTRITION_STREAM_PATHS = (
+    "meal_nutrition.breakdown.item",
+    "meal_nutrition.total_calories",
+    "meal_nutrition.macros",
+)
+
+
+class FencedJsonFilter:
+    """
+    Strips an optional markdown fence from streamed text so that only the
+    JSON object itself reaches the incremental parser.
+    """
+
+    def __init__(self):
+        self._started = False
+        self._finished = False
+        self._pending = ""
+
+    def feed(self, text: str) -> str:
+        """Return the part of this chunk that belongs to the JSON object."""
+        if self._finished:
+            return ""
+        text = self._pending + text
+        self._pending = ""
+        
+        if not self._started:
+            start = text.find("{")
+            if start == -1:
+                return ""
+            self._started = True
+            text = text[start:]
+        
+        end = text.find("```")
+        if end != -1:
+            self._finished = True
+            return text[:end]
+        
+        # Hold back trailing backticks in case a closing fence is split across chunks
+        body = text.rstrip("`")
+        self._pending = text[len(body):]
+        return body
+
+
+def _ndjson_line(event: Dict[str, Any]) -> bytes:
+    """Serialize one streaming event as a newline-delimited JSON line."""
+    return orjson.dumps(event) + b"\n"
+
+
+def stream_cached_response(response: BaseModel) -> StreamingResponse:
+    """Wrap an already available response as a single-event NDJSON stream."""
+    event = _ndjson_line({"event": "complete", "data": response.model_dump()})
+    return StreamingResponse(iter([event]), media_type="application/x-ndjson")
+
+
+async def stream_gemini_json(prompt: str, paths: tuple, adapter: TypeAdapter, cache_key: str):
+    """
+    Stream a Gemini response as NDJSON events, parsing the JSON incrementally.
+    
+    Emits a "partial" event for every value found under one of the given
+    paths as soon as it is complete, then a single "complete" event with
+    the validated response (which is also cached). Failures after the
+    stream has started are reported as an "error" event.
+    
+    Args:
+        prompt: Prompt to send to Gemini
+        paths: ijson prefixes to emit as partial events
+        adapter: TypeAdapter used to validate the full response
+        cache_key: Key under which to cache the validated response
+        
+    Yields:
+        NDJSON encoded event lines
+    """
+    parsers = []
+    for path in paths:
+        values = ijson.sendable_list()
+        parsers.append((path, values, ijson.items_coro(values, path, use_float=True)))
+    json_filter = FencedJsonFilter()
+    chunks = []
+    
+    try:
+        logger.info("Streaming from Google Gemini API...")
+        response = await model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            chunks.append(chunk.text)
+            data = json_filter.feed(chunk.text).encode()
+            try:
+                for path, values, parser in parsers:
+                    if data:
+                        parser.send(data)
+                    for value in values:
+                        yield _ndjson_line({"event": "partial", "path": path, "data": value})
+                    del values[:]
+            except ijson.JSONError as e:
+                # Partial events are best effort; the full response is still validated below
+                logger.warning("Stopped incremental parsing: %s", e)
+                parsers = []
+        
+        result = parse_gemini_response("".join(chunks), adapter)
+        response_cache[cache_key] = result
+        yield _ndjson_line({"event": "complete", "data": result.model_dump()})
+        
+    except Exception as e:
+        logger.error("Error streaming response: %s", e)
+        yield _ndjson_line({"event": "error", "detail": str(e)})
+
+
+# ==================== Prefetching ====================
+
+# After a diet plan is generated, plans for nearby weights are generated in the
+# background so likely follow-up requests are served from the cache. Off by
+# default because every prefetch is an additional billed Gemini call.
+PREFETCH_DIET_VARIANTS = os.getenv("PREFETCH_DIET_VARIANTS", "false").lower() == "true"
+PREFETCH_WEIGHT_DELTAS = (-2.0, 2.0)
+PREFETCH_MAX_IN_FLIGHT = 4
+PREFETCH_RATE_LIMIT_BACKOFF = 60.0  # seconds
+
+_prefetch_tasks: set = set()
+_prefetch_paused_until = 0.0
+
+
+def schedule_diet_plan_prefetch(request: DietPlanRequest):
+    """
+    Start background generation of diet plans for weights near the request's.
+    
+    Variants already in the cache are skipped, as is everything once
+    PREFETCH_MAX_IN_FLIGHT prefetches are running or while backing off
+    from a rate limit.
+    
+    Args:
+        request: DietPlanRequest that was just served
+    """
+    if not PREFETCH_DIET_VARIANTS:
+        return
+    
+    loop = asyncio.get_running_loop()
+    if loop.time() < _prefetch_paused_until:
+        return
+    
+    for delta in PREFETCH_WEIGHT_DELTAS:
+        if len(_prefetch_tasks) >= PREFETCH_MAX_IN_FLIGHT:
+            return
+        # Round away float drift (64.1 + 2.0 == 66.10000000000001) so the key
+        # matches a later request for the same weight
+        weight = round(request.current_weight + delta, 1)
+        if weight <= 0:
+            continue
+        variant = request.model_copy(update={"current_weight": weight})
+        cache_key = request_cache_key("diet_plan", variant, exclude={"name"})
+        if cache_key in response_cache:
+            continue
+        
+        task = loop.create_task(_prefetch_diet_plan(variant, cache_key))
+        _prefetch_tasks.add(task)
+        task.add_done_callback(_prefetch_tasks.discard)
+
+
+async def _prefetch_diet_plan(request: DietPlanRequest, cache_key: str):
+    """Generate one diet plan variant and store it in the response cache."""
+    global _prefetch_paused_until
+    try:
+        response_text = await generate_text(construct_diet_plan_prompt(request))
+        response_cache[cache_key] = parse_gemini_response(response_text, DIET_PLAN_ADAPTER)
+        logger.info("Prefetched diet plan for weight %s kg", request.current_weight)
+    except google_exceptions.ResourceExhausted:
+        logger.warning("Gemini rate limit reached; pausing diet plan prefetch")
+        _prefetch_paused_until = asyncio.get_running_loop().time() + PREFETCH_RATE_LIMIT_BACKOFF
+    except Exception as e:
+        logger.warning("Diet plan prefetch failed: %s", e)
+
+
 # ==================== API Endpoints ====================
 
+# Mangum runs the startup hook on every Lambda invocation; connect only once
+_gemini_channel_ready = False
+
+
+@app.on_event("startup")
+async def connect_gemini_channel():
+    """
+    Open the shared Gemini channel before the first request arrives.
+    
+    The SDK keeps a single async client per process and multiplexes every
+    call over its HTTP/2 channel, so connecting it up front moves the TCP
+    and TLS handshake off the first request instead of paying it there.
+    """
+    global _gemini_channel_ready
+    if _gemini_channel_ready:
+        return
+    _gemini_channel_ready = True
+    
+    try:
+        # Same cached client that model.generate_content_async uses
+        async_client = genai_client.get_default_generative_async_client()
+        await asyncio.wait_for(async_client.transport.grpc_channel.channel_ready(), timeout=5)
+        logger.info("Gemini channel connected")
+    except asyncio.TimeoutError:
+        logger.warning("Timed out pre-connecting Gemini channel; first request will connect")
+    except Exception as e:
+        logger.warning("Could not pre-connect Gemini channel: %s", e)
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
@@ -282,6 +998,7 @@ async def root():
         "endpoints": {
             "/generate_diet_plan": "POST - Generate personalized diet plan",
             "/nutrition_breakdown": "POST - Analyze food nutrition",
+            "/batch_nutrition_breakdown": "POST - Analyze nutrition for several meals",
             "/docs": "GET - API documentation"
         }
     }
@@ -294,91 +1011,192 @@ async def health_check():
 
 
 @app.post("/generate_diet_plan", response_model=DietPlanResponse)
-async def generate_diet_plan(request: DietPlanRequest):
+async def generate_diet_plan(request: DietPlanRequest, stream: bool = False):
     """
     Generate a personalized 7-day diet plan based on user parameters.
     
     Args:
         request: DietPlanRequest containing user information
+        stream: Stream partial results as NDJSON events while generating
         
     Returns:
-        DietPlanResponse with generated diet plan
+        DietPlanResponse with generated diet plan, or an NDJSON stream
         
     Raises:
         HTTPException: If API call fails or response parsing fails
     """
     try:
-        logger.info(f"Generating diet plan for user: {request.name}")
+        logger.info("Generating diet plan for user: %s", request.name)
+        
+        # The user's name is not reflected in the plan, so leave it out of the key
+        cache_key = request_cache_key("diet_plan", request, exclude={"name"})
+        cached_response = response_cache.get(cache_key)
+        if cached_response is not None:
+            logger.info("Serving diet plan from cache")
+            return stream_cached_response(cached_response) if stream else cached_response
         
         # Construct prompt
         prompt = construct_diet_plan_prompt(request)
         
+        if stream:
+            return StreamingResponse(
+                stream_gemini_json(prompt, DIET_PLAN_STREAM_PATHS, DIET_PLAN_ADAPTER, cache_key),
+                media_type="application/x-ndjson"
+            )
+        
         # Call Gemini API
         logger.info("Calling Google Gemini API...")
-        response = model.generate_content(prompt)
-        
-        # Parse response
-        parsed_response = parse_gemini_response(response.text)
-        logger.info("Parsed response: ", parsed_response)
-        # Validate and structure response
-        diet_plan_response = DietPlanResponse(**parsed_response)
-        logger.info("Diet plan response: ", diet_plan_response.model_dump_json())
-        logger.info("Diet plan generated successfully")
+        response_text = await generate_text(prompt)
+        
+        # Parse and validate response
+        diet_plan_response = parse_gemini_response(response_text, DIET_PLAN_ADAPTER)
+        response_cache[cache_key] = diet_plan_response
+        schedule_diet_plan_prefetch(request)
+        logger.info(
+            "Diet plan generated successfully for %s: %s kcal",
+            request.name, diet_plan_response.daily_plan.total_calories
+        )
         return diet_plan_response
         
     except ValueError as e:
-        logger.error(f"Error parsing response: {str(e)}")
+        logger.error("Error parsing response: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
-        logger.error(f"Error generating diet plan: {str(e)}")
+        logger.error("Error generating diet plan: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to generate diet plan: {str(e)}")
 
 
+async def analyze_nutrition(request: NutritionRequest, stream: bool = False):
+    """
+    Resolve one nutrition request, calling Gemini only when needed.
+    
+    Empty requests, cached requests and requests made up of common foods are
+    answered directly; everything else goes through the micro-batcher.
+    
+    Args:
+        request: NutritionRequest containing list of food items
+        stream: Return an NDJSON stream instead of the response model
+        
+    Returns:
+        NutritionBreakdownResponse, or a StreamingResponse when stream is set
+    """
+    # Nothing to analyze; answer directly instead of calling Gemini
+    if not request.foods:
+        empty_response = NutritionBreakdownResponse(meal_nutrition=MealNutrition(
+            total_calories=0,
+            macros=MacroNutrients(protein=0, carbs=0, fat=0),
+            breakdown=[]
+        ))
+        return stream_cached_response(empty_response) if stream else empty_response
+    
+    cache_key = request_cache_key("nutrition", request)
+    cached_response = response_cache.get(cache_key)
+    if cached_response is not None:
+        logger.info("Serving nutrition breakdown from cache")
+        return stream_cached_response(cached_response) if stream else cached_response
+    
+    # Common foods with plain quantities are answered without calling Gemini
+    local_response = lookup_local_nutrition(request)
+    if local_response is not None:
+        logger.info("Serving nutrition breakdown from local food table")
+        return stream_cached_response(local_response) if stream else local_response
+    
+    if stream:
+        # Streamed requests get their own Gemini call instead of joining a batch
+        return StreamingResponse(
+            stream_gemini_json(
+                construct_nutrition_prompt(request), NUTRITION_STREAM_PATHS,
+                NUTRITION_ADAPTER, cache_key
+            ),
+            media_type="application/x-ndjson"
+        )
+    
+    # Analyze together with any concurrent requests in a single Gemini call
+    nutrition_response = await nutrition_batcher.submit(request)
+    
+    response_cache[cache_key] = nutrition_response
+    return nutrition_response
+
+
 @app.post("/nutrition_breakdown", response_model=NutritionBreakdownResponse)
-async def nutrition_breakdown(request: NutritionRequest):
+async def nutrition_breakdown(request: NutritionRequest, stream: bool = False):
     """
     Analyze nutritional content of food items.
     
     Args:
         request: NutritionRequest containing list of food items
+        stream: Stream partial results as NDJSON events while analyzing
         
     Returns:
-        NutritionBreakdownResponse with nutritional analysis
+        NutritionBreakdownResponse with nutritional analysis, or an NDJSON stream
         
     Raises:
         HTTPException: If API call fails or response parsing fails
     """
     try:
-        logger.info(f"Analyzing nutrition for {len(request.foods)} food items")
+        logger.info("Analyzing nutrition for %s food items", len(request.foods))
         
-        # Construct prompt
-        prompt = construct_nutrition_prompt(request)
+        nutrition_response = await analyze_nutrition(request, stream)
         
-        # Call Gemini API
-        logger.info("Calling Google Gemini API...")
-        response = model.generate_content(prompt)
+        logger.info("Nutrition breakdown completed successfully")
+        return nutrition_response
         
-        # Parse response
-        parsed_response = parse_gemini_response(response.text)
+    except ValueError as e:
+        logger.error("Error parsing response: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.error("Error analyzing nutrition: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to analyze nutrition: {str(e)}")
+
+
+@app.post("/batch_nutrition_breakdown", response_model=List[NutritionBreakdownResponse])
+async def batch_nutrition_breakdown(request: BatchNutritionRequest):
+    """
+    Analyze nutritional content of several meals in one call.
+    
+    Meals are resolved concurrently, so those that need Gemini are collated
+    by the micro-batcher into as few Gemini calls as possible.
+    
+    Args:
+        request: BatchNutritionRequest containing the meals to analyze
         
-        # Validate and structure response
-        nutrition_response = NutritionBreakdownResponse(**parsed_response)
+    Returns:
+        List of NutritionBreakdownResponse, one per meal in request order
         
-        logger.info("Nutrition breakdown completed successfully")
-        return nutrition_response
+    Raises:
+        HTTPException: If API call fails or response parsing fails
+    """
+    try:
+        logger.info("Analyzing nutrition for %s meals", len(request.meals))
+        
+        nutrition_responses = await asyncio.gather(*[analyze_nutrition(meal) for meal in request.meals])
+        
+        logger.info("Batch nutrition breakdown completed successfully")
+        return nutrition_responses
         
     except ValueError as e:
-        logger.error(f"Error parsing response: {str(e)}")
+        logger.error("Error parsing response: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
-        logger.error(f"Error analyzing nutrition: {str(e)}")
+        logger.error("Error analyzing nutrition: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to analyze nutrition: {str(e)}")
 
 
-# Run the application
-# if __name__ == "__main__":
-#     import uvicorn
-#     uvicorn.run(app, host="0.0.0.0", port=8000)
+# Run the application (on AWS Lambda, Mangum serves the app instead)
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        # uvloop and httptools are picked up automatically when installed
+        # (see requirements-dev.txt); uvloop is not available on Windows
+        loop="auto",
+        http="auto",
+        # Each worker is a separate process with its own caches
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 2)),
+        log_level=LOG_LEVEL.lower()
+    )
 lambda_handler = Mangum(app)
 
 
@@ -1,6 +1,7 @@
 import google.generativeai as genai
 from dotenv import load_dotenv
 import os 
+import sys
 
 # ✅ Load environment variables from .env (if exists)
 load_dotenv()
@@ -24,13 +25,14 @@ try:
     if not models:
         print("⚠️ No models found for this API key.")
     else:
+        lines = []
         for i, model in enumerate(models, 1):
-            print(f"{i}. {model.name}")
-            print(f"   Supported methods: {model.supported_generation_methods}\n")
-            with open("models.txt", "a") as f:
-                f.write(f"{i}. {model.name}\n")
-                f.write(f"   Supported methods: {model.supported_generation_methods}\n")
-                
+            lines.append(f"{i}. {model.name}\n   Supported methods: {model.supported_generation_methods}\n")
+        sys.stdout.write("".join(lines))
+
+        # Single write per run; truncate so repeated runs don't keep appending
+        with open("models.txt", "w") as f:
+            f.writelines(lines)
 
     print("✅ Model listing completed successfully.")
 